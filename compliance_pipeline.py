@@ -7,13 +7,18 @@ This script implements a complete pipeline for compliance analysis:
 3. Excel Conversion: Convert JSON results to Excel for reporting
 
 Usage:
-    python compliance_pipeline.py [--skip-validation] [--clean-cache]
+    python compliance_pipeline.py [--skip-validation] [--clean-cache] [--validation-workers N]
 """
 
 import os
+import io
 import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, redirect_stdout
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 from tqdm import tqdm
 
 import sys
@@ -23,6 +28,40 @@ from enhanced_client_document_analyzer.enhanced_compliance_analyzer import Enhan
 from enhanced_client_document_analyzer.convert_json_to_excel import convert_json_to_excel
 from enhanced_client_document_analyzer.consolidated_report_generator import generate_consolidated_report
 
+def _validation_workers_from_env():
+    """Read VALIDATION_WORKERS from the environment, falling back to 1 if it is unset or invalid"""
+    try:
+        return max(1, int(os.environ.get("VALIDATION_WORKERS", "1")))
+    except ValueError:
+        return 1
+
+# Number of documents validated concurrently (each validation is an API call). Defaults to
+# 1 (sequential): DocumentValidator is not known to be thread-safe and rate-limited API calls
+# are not retried. Override with the VALIDATION_WORKERS environment variable or --validation-workers.
+VALIDATION_WORKERS = _validation_workers_from_env()
+
+# Stage indexes reported in ProgressEvent (Phase 1 and Phase 2 run inside the analyzer)
+(STAGE_PROCESSING, STAGE_VALIDATION, STAGE_SCREENING, STAGE_REASONING,
+ STAGE_JSON_RESULTS, STAGE_EXCEL, STAGE_CONSOLIDATED) = range(7)
+
+@dataclass
+class ProgressEvent:
+    """
+    A progress update reported by run_compliance_pipeline.
+    
+    Attributes:
+        stage (int): Stage index (one of the STAGE_* constants)
+        progress (int): Stage progress percentage (0-100)
+        status (str): Stage status ("In Progress", "Complete" or "Error")
+        message (str): Short description of what just happened
+        relevant_documents (int, optional): Relevant documents found so far during validation
+    """
+    stage: int
+    progress: int
+    status: str
+    message: str
+    relevant_documents: Optional[int] = None
+
 def clear_cache_directory(cache_dir):
     """
     Clear the cache directory to force fresh API calls.
@@ -46,17 +85,24 @@ def get_base_dir():
     script_dir = Path(os.path.dirname(os.path.abspath(__file__)))
     return script_dir
 
-def run_compliance_pipeline(skip_validation=False, clean_cache=False):
+def run_compliance_pipeline(skip_validation=False, clean_cache=False, progress_cb=None,
+                            validation_workers=VALIDATION_WORKERS):
     """
     Run the complete compliance analysis pipeline.
     
     Args:
         skip_validation (bool): Whether to skip document validation
         clean_cache (bool): Whether to clean the cache before running
+        progress_cb (callable, optional): Called with a ProgressEvent at each stage boundary
+        validation_workers (int): Number of documents to validate concurrently (1 = sequential)
         
     Returns:
         tuple: (Path to JSON results, Path to Excel file, Path to consolidated Excel file)
     """
+    def report(stage, progress, status, message, relevant_documents=None):
+        if progress_cb is not None:
+            progress_cb(ProgressEvent(stage, progress, status, message, relevant_documents))
+    
     # Initialize components
     base_dir = get_base_dir()
     document_processor = DocumentProcessor(base_dir=base_dir)
@@ -71,32 +117,50 @@ def run_compliance_pipeline(skip_validation=False, clean_cache=False):
     
     # Step 1: Process all documents
     print("\n=== Step 1: Processing Documents ===")
+    report(STAGE_PROCESSING, 10, "In Progress", "Processing documents")
     documents = document_processor.process_all_documents()
     print(f"Processed {len(documents)} documents")
+    report(STAGE_PROCESSING, 100, "Complete", f"Processed {len(documents)} documents")
     
     # Step 2: Validate documents (if not skipped)
     relevant_documents = []
     if not skip_validation:
         print("\n=== Step 2: Validating Documents ===")
-        for doc in tqdm(documents, desc="Validating documents"):
-            doc_name = doc.get('metadata', {}).get('filename', 'Unknown Document')
-            validation_result = document_validator.validate_document(doc)
-            
-            if validation_result["is_relevant"]:
-                print(f"✅ {doc_name}: Relevant - {validation_result['reason']}")
-                relevant_documents.append(doc)
+        report(STAGE_VALIDATION, 0, "In Progress", "Validating documents for relevance")
+        validation_results = []
+        # Validation calls are network-bound, so they can optionally run concurrently.
+        # Both map()s yield in input order, keeping the log output deterministic.
+        with ExitStack() as stack:
+            if validation_workers > 1:
+                executor = stack.enter_context(ThreadPoolExecutor(max_workers=validation_workers))
+                validation_outcomes = executor.map(document_validator.validate_document, documents)
             else:
-                print(f"❌ {doc_name}: Not relevant - {validation_result['reason']}")
+                validation_outcomes = map(document_validator.validate_document, documents)
+            for doc, validation_result in tqdm(zip(documents, validation_outcomes),
+                                               total=len(documents), desc="Validating documents"):
+                metadata = doc.get('metadata') or {}
+                doc_name = metadata.get('filename', 'Unknown Document')
+                is_relevant = validation_result["is_relevant"]
+                
+                if is_relevant:
+                    print(f"✅ {doc_name}: Relevant - {validation_result['reason']}")
+                    relevant_documents.append(doc)
+                    message = f"Found relevant document: {doc_name}"
+                else:
+                    print(f"❌ {doc_name}: Not relevant - {validation_result['reason']}")
+                    message = f"Skipping non-relevant document: {doc_name}"
+                
+                # Record the outcome here rather than re-scanning relevant_documents later
+                validation_results.append({
+                    "document_name": metadata.get('filename', 'Unknown'),
+                    "is_relevant": bool(is_relevant)
+                })
+                report(STAGE_VALIDATION, 100 * len(validation_results) // len(documents), "In Progress", message,
+                       relevant_documents=len(relevant_documents))
                 
         # Save validation results
         validation_results_path = base_dir / "output" / "enhanced_document_analysis" / "document_validation_results.json"
-        validation_results = [
-            {
-                "document_name": doc.get('metadata', {}).get('filename', 'Unknown'),
-                "is_relevant": doc in relevant_documents
-            }
-            for doc in documents
-        ]
+        validation_results_path.parent.mkdir(parents=True, exist_ok=True)
         with open(validation_results_path, 'w', encoding='utf-8') as f:
             json.dump(validation_results, f, indent=2)
     else:
@@ -104,6 +168,8 @@ def run_compliance_pipeline(skip_validation=False, clean_cache=False):
         relevant_documents = documents
     
     print(f"\nFound {len(relevant_documents)} relevant documents for compliance analysis")
+    report(STAGE_VALIDATION, 100, "Complete", f"Found {len(relevant_documents)} relevant documents",
+           relevant_documents=len(relevant_documents))
     
     # Step 3: Analyze compliance for relevant documents
     json_path = None
@@ -112,25 +178,33 @@ def run_compliance_pipeline(skip_validation=False, clean_cache=False):
     
     if relevant_documents:
         print("\n=== Step 3: Analyzing Compliance ===")
+        report(STAGE_SCREENING, 10, "In Progress", "Analyzing compliance against regulations")
         analysis_results = compliance_analyzer.analyze_all_documents(relevant_documents)
         
         # Step 4: Save results to JSON
         json_path = compliance_analyzer.save_analysis_results(analysis_results)
         print(f"Saved compliance analysis results to {json_path}")
+        report(STAGE_REASONING, 100, "Complete", "Compliance analysis complete")
+        report(STAGE_JSON_RESULTS, 100, "Complete", "Saved analysis results")
         
         # Step 5: Convert JSON to Excel
         print("\n=== Step 5: Converting to Excel ===")
+        report(STAGE_EXCEL, 50, "In Progress", "Creating Excel report")
         excel_path = convert_json_to_excel()
         print(f"Excel report generated successfully at {excel_path}")
+        report(STAGE_EXCEL, 100, "Complete", "Excel report created successfully")
         
         # Step 6: Generate consolidated report
         print("\n=== Step 6: Generating Consolidated Report ===")
+        report(STAGE_CONSOLIDATED, 50, "In Progress", "Creating consolidated summary report")
         try:
             from enhanced_client_document_analyzer.consolidated_report_generator import generate_consolidated_report
             consolidated_excel_path = generate_consolidated_report()
             print(f"Consolidated report generated successfully at {consolidated_excel_path}")
+            report(STAGE_CONSOLIDATED, 100, "Complete", "Consolidated report created successfully")
         except Exception as e:
             print(f"Warning: Could not generate consolidated report: {str(e)}")
+            report(STAGE_CONSOLIDATED, 100, "Error", f"Could not generate consolidated report: {str(e)}")
         
         print("\n=== Analysis Complete ===")
         return json_path, excel_path, consolidated_excel_path
@@ -139,15 +213,51 @@ def run_compliance_pipeline(skip_validation=False, clean_cache=False):
         print("\n=== Analysis Complete ===")
         return None, None, None
 
+class _QueueWriter(io.TextIOBase):
+    """Text stream that puts each non-empty line written to it on a queue"""
+    def __init__(self, event_queue):
+        self.event_queue = event_queue
+    
+    def write(self, s):
+        if s.strip():
+            self.event_queue.put(s.strip())
+        return len(s)
+
+def run_compliance_pipeline_to_queue(event_queue, skip_validation=False, clean_cache=False):
+    """
+    Run the pipeline, forwarding its progress to a queue.
+    
+    Intended as the target of a worker process: ProgressEvents are put on the
+    queue as they are reported, and printed output is put on it line by line
+    as plain strings.
+    
+    Args:
+        event_queue: Queue (e.g. from multiprocessing.Manager) to receive updates
+        skip_validation (bool): Whether to skip document validation
+        clean_cache (bool): Whether to clean the cache before running
+        
+    Returns:
+        tuple: Same as run_compliance_pipeline
+    """
+    with redirect_stdout(_QueueWriter(event_queue)):
+        return run_compliance_pipeline(
+            skip_validation=skip_validation,
+            clean_cache=clean_cache,
+            progress_cb=event_queue.put
+        )
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the compliance analysis pipeline")
     parser.add_argument("--skip-validation", action="store_true", help="Skip document validation")
     parser.add_argument("--clean-cache", action="store_true", help="Clean cache before running")
+    parser.add_argument("--validation-workers", type=int, default=VALIDATION_WORKERS,
+                        help="Number of documents to validate concurrently (default: %(default)s)")
     args = parser.parse_args()
     
     json_path, excel_path, consolidated_excel_path = run_compliance_pipeline(
         skip_validation=args.skip_validation,
-        clean_cache=args.clean_cache
+        clean_cache=args.clean_cache,
+        validation_workers=max(1, args.validation_workers)
     )
     
     if json_path and excel_path:
@@ -1,16 +1,21 @@
 import streamlit as st
 import subprocess
-import threading
-import time
 import os
 import sys
-import io
 import json
 from datetime import datetime
 import shutil
 import socket
+import queue
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-# Function to get local IP address
+# Function to get local IP address, looked up once per server process
+# (the sidebar asks for it on every rerun)
+@st.cache_resource(show_spinner=False)
 def get_local_ip():
     try:
         # Get the local IP address
@@ -26,7 +31,7 @@ def get_local_ip():
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import project modules
-from compliance_pipeline import run_compliance_pipeline
+from compliance_pipeline import ProgressEvent, run_compliance_pipeline_to_queue
 
 # Configure the page
 st.set_page_config(
@@ -39,22 +44,16 @@ st.set_page_config(
     }
 )
 
-# Load custom CSS
-with open(os.path.join(os.path.dirname(__file__), "assets", "style.css")) as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-
-# Global variables to track process state
-process_running = False
-process_output = []
-process_status = "Ready"
-process_progress = 0
-relevant_document_count = 0
-json_result_path = None
-excel_result_path = None
-consolidated_excel_path = None
-
-# Pipeline stages and their progress
-pipeline_stages = [
+# Load custom CSS (read from disk once per server process, not on every rerun)
+@st.cache_resource(show_spinner=False)
+def load_css():
+    with open(os.path.join(os.path.dirname(__file__), "assets", "style.css")) as f:
+        return f.read()
+
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
+
+# Pipeline stages (each analysis run tracks progress on its own copy)
+PIPELINE_STAGES = [
     {"name": "Document Processing", "progress": 0, "status": "Pending", "emoji": "📄"},
     {"name": "Document Validation", "progress": 0, "status": "Pending", "emoji": "✅"},
     {"name": "Phase 1: Screening Regulations", "progress": 0, "status": "Pending", "emoji": "🔎"},
@@ -64,126 +63,161 @@ pipeline_stages = [
     {"name": "Consolidated Report", "progress": 0, "status": "Pending", "emoji": "📑"}
 ]
 
+# Weight of each stage in the overall progress, according to its typical duration/importance.
+# Integer percentages (summing to 100) keep the running total exact, with no float drift.
+STAGE_WEIGHTS = (5, 10, 25, 30, 10, 10, 10)
+
+class AnalysisRun:
+    """
+    State of one analysis run.
+    
+    Kept in st.session_state rather than in module globals, because Streamlit
+    resets module globals on every rerun and a run must survive reruns such as
+    toggling a sidebar option.
+    
+    Attributes:
+        future (Future): Result of the run in the worker process (None when idle)
+        progress_queue: Manager queue the worker puts its updates on
+        executor (ProcessPoolExecutor): Worker pool the run was submitted to
+        manager: Manager process that owns progress_queue
+        finished (bool): Whether the outcome of the run has been recorded
+        output (deque): Raw pipeline output; only the most recent lines are kept
+        output_count (int): Total lines received, including those dropped from output
+        status (str): Current activity text
+        progress (int): Overall completion percentage
+        relevant_document_count (int): Relevant documents found by validation
+        activity_log (deque): Simplified activity log: unique messages in arrival order
+        seen_msgs (set): Messages already in the activity log
+        stages (list): Progress and status of each pipeline stage
+        weighted_total (int): Running sum of stage progress * weight, kept in step with stages
+    """
+    def __init__(self, future=None, progress_queue=None, executor=None, manager=None):
+        self.future = future
+        self.progress_queue = progress_queue
+        self.executor = executor
+        self.manager = manager
+        self.finished = future is None
+        self.output = deque(maxlen=2000)
+        self.output_count = 0
+        self.status = "Ready" if future is None else "Starting analysis..."
+        self.progress = 0
+        self.relevant_document_count = 0
+        self.activity_log = deque(maxlen=500)
+        self.seen_msgs = set()
+        self.stages = [dict(stage) for stage in PIPELINE_STAGES]
+        self.weighted_total = 0
+
+# Classifiers for the progress lines the compliance analyzer prints during Phase 1 and
+# Phase 2, in priority order (the first match wins). Pipeline stage boundaries arrive as
+# ProgressEvents instead. Each rule is (kind, phrase the line must contain, phrase its
+# lowercased text must also contain or None); plain substring checks keep lines that
+# match no rule, which is most output, cheap.
+_LOG_RULES = (
+    ("phase1", "Phase 1:", "checking which regulations apply"),
+    ("screening", "Screening regulations:", None),
+    ("phase2", "Phase 2:", "detailed compliance analysis"),
+    ("analyzing_doc", "Analyzing document:", None),
+    ("reasoning", "Reasoning progress:", None),
+    ("reasoning", "Detailed analysis:", None),
+)
+
+def _parse_percent(line):
+    """Extract the percentage from a line like "Screening regulations: 64%" """
+    return int(line.split('%')[0].split(':')[-1].strip())
+
+# Handlers for each classified log line: update stage progress and return the display message
+def _on_phase1(run, line):
+    update_stage_progress(run, 2, 50, "In Progress")  # Update Phase 1: Screening
+    return "🔎 Phase 1: Screening which regulations apply to documents"
+
+def _on_screening(run, line):
+    try:
+        percent = _parse_percent(line)
+        update_stage_progress(run, 2, percent, "In Progress")
+        return f"🔎 Screening regulations: {percent}% complete"
+    except:
+        return "🔎 Screening regulations in progress"
+
+def _on_phase2(run, line):
+    update_stage_progress(run, 2, 100, "Complete")  # Complete Phase 1: Screening
+    update_stage_progress(run, 3, 30, "In Progress")  # Start Phase 2: Reasoning
+    return "🧠 Phase 2: Performing detailed compliance reasoning"
+
+def _on_analyzing_doc(run, line):
+    return f"🔍 Analyzing: {line.split('Analyzing document:')[1].strip()}"
+
+def _on_reasoning(run, line):
+    # Lines look like "Reasoning progress: 45%" or "Detailed analysis: 45%"
+    try:
+        percent = _parse_percent(line)
+        update_stage_progress(run, 3, percent, "In Progress")
+        return f"🧠 Reasoning progress: {percent}% complete"
+    except:
+        return "🧠 Reasoning in progress"
+
+_LOG_HANDLERS = {
+    "phase1": _on_phase1,
+    "screening": _on_screening,
+    "phase2": _on_phase2,
+    "analyzing_doc": _on_analyzing_doc,
+    "reasoning": _on_reasoning,
+}
+
+# Current-activity text shown for classified log lines
+_LOG_STATUS = {
+    "phase1": "Checking which regulations apply",
+    "phase2": "Performing detailed compliance analysis",
+}
+
 # Define simplified log messages for user understanding
-def simplify_log_message(line):
-    """Convert technical log messages to user-friendly messages"""
-    global relevant_document_count
+def simplify_log_message(run, line):
+    """Convert the analyzer's progress lines to user-friendly messages (None for other lines)"""
     if not line:
         return None
-        
-    # Processing documents
-    if "Processing Documents" in line:
-        update_stage_progress(0, 10, "In Progress")  # Start document processing
-        return "🔄 Starting document processing..."
-    elif "Processed" in line and "documents" in line:
-        update_stage_progress(0, 100, "Complete")  # Complete document processing
-        return f"📄 {line}"
-        
-    # Validation
-    elif "Validating Documents" in line:
-        update_stage_progress(1, 10, "In Progress")  # Start validation
-        return "🔄 Starting document validation..."
-    elif ": Relevant -" in line:
-        update_stage_progress(1, None)  # Increment validation progress
-        # Update relevant document count
-        relevant_document_count += 1
-        return f"✅ Found relevant document: {line.split(':')[0].strip()}"
-    elif ": Not relevant -" in line:
-        update_stage_progress(1, None)  # Increment validation progress
-        return f"❌ Skipping non-relevant document: {line.split(':')[0].strip()}"
-    elif "Found" in line and "relevant documents" in line:
-        update_stage_progress(1, 100, "Complete")  # Complete validation
-        # Extract relevant document count if not already set
-        if relevant_document_count == 0:
-            try:
-                count = int(line.split("Found")[1].split("relevant")[0].strip())
-                relevant_document_count = count
-            except:
-                pass
-        return f"📋 {line}"
-        
-    # Analysis
-    elif "Analyzing Compliance" in line:
-        update_stage_progress(2, 10, "In Progress")  # Start Phase 1: Screening
-        return "🔄 Starting compliance analysis..."
-    elif "Phase 1:" in line and "checking which regulations apply" in line.lower():
-        update_stage_progress(2, 50, "In Progress")  # Update Phase 1: Screening
-        return "🔎 Phase 1: Screening which regulations apply to documents"
-    elif "Screening regulations:" in line:
-        # Extract percentage from line like "Screening regulations: 64%"
-        try:
-            percent = int(line.split('%')[0].split(':')[-1].strip())
-            update_stage_progress(2, percent, "In Progress")
-            return f"🔎 Screening regulations: {percent}% complete"
-        except:
-            update_stage_progress(2, None)  # Just increment if parsing fails
-            return "🔎 Screening regulations in progress"
-    elif "Phase 2:" in line and "detailed compliance analysis" in line.lower():
-        update_stage_progress(2, 100, "Complete")  # Complete Phase 1: Screening
-        update_stage_progress(3, 30, "In Progress")  # Start Phase 2: Reasoning
-        return "🧠 Phase 2: Performing detailed compliance reasoning"
-    elif "Analyzing document:" in line:
-        update_stage_progress(3, None)  # Increment Phase 2: Reasoning progress
-        return f"🔍 Analyzing: {line.split('Analyzing document:')[1].strip()}"
-    elif "Reasoning progress:" in line or "Detailed analysis:" in line:
-        # Extract percentage from line like "Reasoning progress: 45%" or "Detailed analysis: 45%"
-        try:
-            percent = int(line.split('%')[0].split(':')[-1].strip())
-            update_stage_progress(3, percent, "In Progress")
-            return f"🧠 Reasoning progress: {percent}% complete"
-        except:
-            update_stage_progress(3, None)  # Just increment if parsing fails
-            return "🧠 Reasoning in progress"
-    elif "Saved compliance analysis results" in line:
-        update_stage_progress(3, 100, "Complete")  # Complete Phase 2: Reasoning
-        update_stage_progress(4, 100, "Complete")  # Complete JSON results
-        return "💾 Saved analysis results"
-        
-    # Report generation
-    elif "Converting to Excel" in line:
-        update_stage_progress(5, 50, "In Progress")  # Start Excel conversion
-        return "🔄 Converting results to Excel..."
-    elif "Excel report generated successfully" in line:
-        update_stage_progress(5, 100, "Complete")  # Complete Excel conversion
-        return "📊 Excel report generated successfully"
-    elif "Generating Consolidated Report" in line:
-        update_stage_progress(6, 50, "In Progress")  # Start consolidated report
-        return "🔄 Creating consolidated report..."
-    elif "Consolidated report generated successfully" in line:
-        update_stage_progress(6, 100, "Complete")  # Complete consolidated report
-        return "📑 Consolidated report created successfully"
-    elif "Analysis Complete" in line:
-        # Ensure all stages are complete
-        for i in range(len(pipeline_stages)):
-            update_stage_progress(i, 100, "Complete")
-        return "🎉 Analysis Complete! Reports are ready."
-        
-    # Default: return the original line
-    return line
+    
+    for kind, phrase, lower_phrase in _LOG_RULES:
+        if phrase in line and (lower_phrase is None or lower_phrase in line.lower()):
+            break
+    else:
+        return None
+    if kind in _LOG_STATUS:
+        run.status = _LOG_STATUS[kind]
+    return _LOG_HANDLERS[kind](run, line)
+
+def add_activity(run, message):
+    """Add a message to the activity log, skipping messages already shown"""
+    if message not in run.seen_msgs:
+        run.seen_msgs.add(message)
+        run.activity_log.append(message)
+
+def record_output_line(run, line):
+    """Keep a line of pipeline output and add its simplified message to the activity log"""
+    run.output.append(line)
+    run.output_count += 1
+    simple_msg = simplify_log_message(run, line)
+    if simple_msg:
+        add_activity(run, simple_msg)
+
+def record_progress_event(run, event):
+    """Apply a ProgressEvent reported by the pipeline"""
+    update_stage_progress(run, event.stage, event.progress, event.status)
+    run.status = event.message
+    if event.relevant_documents is not None:
+        run.relevant_document_count = event.relevant_documents
+    add_activity(run, f"{run.stages[event.stage]['emoji']} {event.message}")
 
-def update_stage_progress(stage_index, progress=None, status=None):
+def update_stage_progress(run, stage_index, progress, status=None):
     """Update progress for a specific pipeline stage"""
-    global process_progress
+    stage = run.stages[stage_index]
     
     # Update status if provided
     if status is not None:
-        pipeline_stages[stage_index]["status"] = status
-    
-    # Update progress if provided
-    if progress is not None:
-        pipeline_stages[stage_index]["progress"] = progress
-    elif pipeline_stages[stage_index]["progress"] < 100 and pipeline_stages[stage_index]["status"] == "In Progress":
-        # Increment progress by a small amount (1-3%) for more granular updates
-        import random
-        increment = random.randint(1, 3)  # Random increment between 1-3%
-        pipeline_stages[stage_index]["progress"] += increment
-        pipeline_stages[stage_index]["progress"] = min(pipeline_stages[stage_index]["progress"], 95)  # Cap at 95% until complete
-    
-    # Calculate overall progress based on all stages
-    # Weight the stages according to their typical duration/importance
-    weights = [0.05, 0.1, 0.25, 0.3, 0.1, 0.1, 0.1]  # Weights sum to 1.0
-    weighted_progress = sum(stage["progress"] * weights[i] for i, stage in enumerate(pipeline_stages))
-    process_progress = int(weighted_progress)
+        stage["status"] = status
+    
+    # Update overall progress by this stage's change rather than re-summing all stages
+    run.weighted_total += (progress - stage["progress"]) * STAGE_WEIGHTS[stage_index]
+    stage["progress"] = progress
+    run.progress = run.weighted_total // 100
 
 # Functions for document management
 def save_uploaded_file(uploaded_file):
@@ -194,8 +228,12 @@ def save_uploaded_file(uploaded_file):
     
     # Save the file
     file_path = os.path.join(upload_dir, uploaded_file.name)
+    uploaded_file.seek(0)
     with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+        shutil.copyfileobj(uploaded_file, f, length=1024 * 1024)
+    
+    # Overwriting an existing file does not change the directory mtime
+    _list_documents.clear()
     
     return file_path
 
@@ -213,137 +251,129 @@ def get_document_list():
     if not os.path.exists(input_dir):
         return []
     
-    # Get all PDF files with their modification times and sizes
-    files = []
-    for f in os.listdir(input_dir):
-        if f.endswith('.pdf'):
-            file_path = os.path.join(input_dir, f)
-            size_kb = os.path.getsize(file_path) / 1024
-            mod_time = os.path.getmtime(file_path)
-            mod_date = datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d %H:%M')
-            files.append({
-                'name': f,
-                'size': f"{size_kb:.1f} KB",
-                'date': mod_date
-            })
-    
-    # Sort by most recently modified
-    files.sort(key=lambda x: os.path.getmtime(os.path.join(input_dir, x['name'])), reverse=True)
-    return files
-
-def run_analysis_thread(skip_validation=False, clean_cache=False):
-    """Run the analysis in a separate thread and capture output"""
-    global process_running, process_output, process_status, process_progress
-    global json_result_path, excel_result_path, consolidated_excel_path
-    global relevant_document_count
-    
-    # Reset state
-    process_running = True
-    process_output = []
-    process_status = "Starting analysis..."
-    process_progress = 0
-    relevant_document_count = 0
+    # Uploads and deletions bump the directory mtime, which invalidates the cached listing
+    return _list_documents(input_dir, os.stat(input_dir).st_mtime_ns)
+
+# Only the listing for the current directory mtime is ever used again, so keep just that one
+@st.cache_data(show_spinner=False, max_entries=1)
+def _list_documents(input_dir, dir_mtime_ns):
+    """List the PDF files in input_dir, most recently modified first"""
+    # One stat per file, reused for size, date and sort order
+    with os.scandir(input_dir) as it:
+        entries = [(entry.name, entry.stat()) for entry in it if entry.name.endswith('.pdf')]
+    entries.sort(key=lambda entry: entry[1].st_mtime, reverse=True)
+    
+    return [
+        {
+            'name': name,
+            'name_lower': name.lower(),
+            'size': f"{stat.st_size / 1024:.1f} KB",
+            'date': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M')
+        }
+        for name, stat in entries
+    ]
+
+def read_file_bytes(path):
+    """Read a report for download, reusing the cached bytes until the file is modified"""
+    return _read_file_bytes(path, os.path.getmtime(path))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _read_file_bytes(path, mtime):
+    with open(path, "rb") as f:
+        return f.read()
+
+# The pipeline runs in one persistent worker process, so it does not compete with the
+# Streamlit server for the GIL and a crash in it cannot take the UI down
+@st.cache_resource(show_spinner=False)
+def get_pipeline_executor():
+    """Return the worker process pool and the manager used to create progress queues"""
+    # Spawn rather than fork: forking the multithreaded Streamlit server can deadlock the child
+    mp_context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=1, mp_context=mp_context), mp_context.Manager()
+
+@st.cache_resource(show_spinner=False)
+def _pipeline_executor_lock():
+    """Lock that serialises replacing a broken worker pool across sessions"""
+    return threading.Lock()
+
+def discard_pipeline_executor(executor, manager):
+    """Shut down a broken worker pool and its manager, unless they were already replaced"""
+    # The cached pair is shared by every session. Only the first session to find it broken
+    # replaces it, so a newer pool that another session's run may be using is never touched.
+    with _pipeline_executor_lock():
+        current_executor, current_manager = get_pipeline_executor()
+        if current_executor is not executor:
+            return
+        get_pipeline_executor.clear()
+    executor.shutdown(wait=False)
+    manager.shutdown()
+
+def start_analysis(skip_validation=False, clean_cache=False):
+    """Submit an analysis run to the worker process and return its AnalysisRun"""
+    executor, manager = get_pipeline_executor()
+    try:
+        # A queue per run, so updates from an earlier run can never be mixed into this one
+        progress_queue = manager.Queue()
+        future = executor.submit(run_compliance_pipeline_to_queue, progress_queue,
+                                 skip_validation=skip_validation, clean_cache=clean_cache)
+    except (BrokenProcessPool, OSError, EOFError):
+        # The pool broke during a run no session was watching; replace it and try once more
+        discard_pipeline_executor(executor, manager)
+        executor, manager = get_pipeline_executor()
+        progress_queue = manager.Queue()
+        future = executor.submit(run_compliance_pipeline_to_queue, progress_queue,
+                                 skip_validation=skip_validation, clean_cache=clean_cache)
+    return AnalysisRun(future, progress_queue, executor, manager)
+
+def drain_progress_queue(run, timeout):
+    """Apply queued pipeline updates, waiting up to timeout seconds for the first one"""
+    try:
+        item = run.progress_queue.get(timeout=timeout)
+        while True:
+            # The worker sends ProgressEvents for stage boundaries and plain strings for printed output
+            if isinstance(item, ProgressEvent):
+                record_progress_event(run, item)
+            else:
+                record_output_line(run, item)
+            item = run.progress_queue.get_nowait()
+    except queue.Empty:
+        pass
+    except (OSError, EOFError) as e:
+        # The manager process holding the queue is gone, so no further updates can arrive
+        discard_pipeline_executor(run.executor, run.manager)
+        fail_analysis(run, e)
+
+def fail_analysis(run, error):
+    """Record that an analysis run failed"""
+    run.finished = True
+    run.status = f"Error: {str(error)}"
+    record_output_line(run, f"ERROR: {str(error)}")
+    add_activity(run, f"❌ Error: {str(error)}")
+
+def finish_analysis(run):
+    """Record the outcome of a finished analysis run"""
+    if run.finished:
+        # Already recorded as failed because its progress queue broke
+        return
     
     try:
-        # Redirect stdout to capture output
-        import io
-        from contextlib import redirect_stdout
-        
-        # Create a custom output capture that also updates our UI
-        output_capture = io.StringIO()
-        
-        def update_progress(line):
-            global process_status, process_progress, document_count, relevant_document_count
-            
-            # Update progress based on output lines
-            if "=== Step 1: Processing Documents ===" in line:
-                process_status = "Processing documents"
-                process_progress = 10
-                
-            elif "Processed" in line and "documents" in line:
-                process_progress = 15
-                # Extract number of documents processed
-                try:
-                    num_docs = int(line.split("Processed")[1].split("documents")[0].strip())
-                    document_count = num_docs
-                    process_status = f"Processed {num_docs} documents"
-                except:
-                    pass
-                    
-            elif "=== Step 2: Validating Documents ===" in line:
-                process_status = "Validating documents for relevance"
-                process_progress = 20
-                
-            elif "Found" in line and "relevant documents" in line:
-                process_progress = 25
-                # Extract number of relevant documents
-                try:
-                    num_docs = int(line.split("Found")[1].split("relevant")[0].strip())
-                    relevant_document_count = num_docs
-                    process_status = f"Found {num_docs} relevant documents"
-                except:
-                    pass
-                    
-            elif "=== Step 3: Analyzing Compliance ===" in line:
-                process_status = "Analyzing compliance against regulations"
-                process_progress = 30
-                
-            elif "Phase 1:" in line:
-                process_status = "Checking which regulations apply"
-                process_progress = 40
-                
-            elif "Phase 2:" in line:
-                process_status = "Performing detailed compliance analysis"
-                process_progress = 60
-                
-            elif "Saved compliance analysis results" in line:
-                process_status = "Saving analysis results"
-                process_progress = 75
-                
-            elif "=== Step 5:" in line:
-                process_status = "Creating Excel report"
-                process_progress = 80
-                
-            elif "Excel report generated successfully" in line:
-                process_progress = 85
-                process_status = "Excel report created successfully"
-                
-            elif "=== Step 6:" in line:
-                process_status = "Creating consolidated summary report"
-                process_progress = 90
-                
-            elif "Consolidated report generated successfully" in line:
-                process_progress = 95
-                process_status = "Consolidated report created successfully"
-                
-            elif "=== Analysis Complete ===" in line:
-                process_status = "Analysis complete"
-                process_progress = 100
-            
-            # Add the line to our output log
-            process_output.append(line)
-        
-        # Custom stdout handler
-        class TeeIO(io.StringIO):
-            def write(self, s):
-                super().write(s)
-                if s.strip():  # Only process non-empty lines
-                    update_progress(s.strip())
-                return len(s)
-        
-        # Run the analysis with our custom output capture
-        with redirect_stdout(TeeIO()):
-            # Call the main pipeline function
-            json_path, excel_path, consolidated_path = run_compliance_pipeline(skip_validation=skip_validation, clean_cache=clean_cache)
-            
-        process_status = "Completed"
-        process_progress = 100
-        
+        run.future.result()
     except Exception as e:
-        process_status = f"Error: {str(e)}"
-        process_output.append(f"ERROR: {str(e)}")
-    finally:
-        process_running = False
+        if isinstance(e, BrokenProcessPool):
+            # The worker process died; replace the pool and its manager for the next run
+            discard_pipeline_executor(run.executor, run.manager)
+        fail_analysis(run, e)
+        return
+    
+    # Ensure all stages are complete (stages skipped for lack of relevant documents included)
+    run.finished = True
+    for i, stage in enumerate(run.stages):
+        if stage["status"] != "Error":
+            update_stage_progress(run, i, 100, "Complete")
+    add_activity(run, "🎉 Analysis Complete! Reports are ready.")
+    
+    run.status = "Completed"
+    run.progress = 100
 
 def main():
     # Display Grant Thornton branding
@@ -441,9 +471,10 @@ def main():
             # Add search functionality
             search_term = st.text_input("Search documents", placeholder="Enter filename to search")
             
-            # Filter documents based on search term
+            # Filter documents based on search term (names are lowercased once, when listed)
             if search_term:
-                filtered_docs = [doc for doc in documents if search_term.lower() in doc['name'].lower()]
+                search_lower = search_term.lower()
+                filtered_docs = [doc for doc in documents if search_lower in doc['name_lower']]
             else:
                 filtered_docs = documents
             
@@ -481,37 +512,24 @@ def main():
     # Document stats section
     st.markdown("<h3 style='color: #5a287d;'>Document Statistics</h3>", unsafe_allow_html=True)
     
-    # Count input documents
-    input_dir = os.path.join(os.getcwd(), 'Input', 'Compliance Documents')
-    input_files = [f for f in os.listdir(input_dir) if f.endswith('.pdf')] if os.path.exists(input_dir) else []
-    
     # Display document counts
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Documents for Analysis", len(input_files))
-    with col2:
-        # Only show relevant documents if validation is complete and we have relevant docs
-        if relevant_document_count > 0:
-            st.metric("Relevant Documents", relevant_document_count)
-        elif pipeline_stages[1]["status"] == "Complete":
-            # If validation is complete but no relevant documents found
-            st.metric("Relevant Documents", "0")
-        elif pipeline_stages[1]["status"] == "In Progress":
-            # If validation is in progress
-            st.metric("Documents Being Validated", f"{pipeline_stages[1]['progress']}%")
-        else:
-            # Before validation starts
-            st.metric("Documents Ready", len(input_files))
+        st.metric("Documents for Analysis", len(documents))
+    relevant_metric = col2.empty()
     
     # Run analysis section
     st.markdown("<h2 style='color: #5a287d;'>Run Analysis</h2>", unsafe_allow_html=True)
     
+    # The current run is kept in session state, so a rerun picks it up again instead of losing it
+    run = st.session_state.get("analysis_run") or AnalysisRun()
+    
     # Button to start analysis
-    if st.button("Run CPC Gap Analysis", use_container_width=True, type="primary", disabled=process_running):
-        # Start the analysis in a separate thread
-        thread = threading.Thread(target=run_analysis_thread, args=(skip_validation, clean_cache))
-        thread.daemon = True
-        thread.start()
+    if st.button("Run CPC Gap Analysis", use_container_width=True, type="primary",
+                 disabled=not run.finished and not run.future.done()):
+        # Start the analysis in the worker process, then rerun so the button shows as disabled
+        st.session_state.analysis_run = start_analysis(skip_validation, clean_cache)
+        st.rerun()
     
     # Status and progress section
     st.markdown("<h2 style='color: #5a287d;'>Process Output</h2>", unsafe_allow_html=True)
@@ -521,78 +539,119 @@ def main():
     
     # Stage progress display
     st.markdown("<h2 style='color: #5a287d;'>Analysis Pipeline</h2>", unsafe_allow_html=True)
-    stage_containers = [st.empty() for _ in range(len(pipeline_stages))]
+    stages_placeholder = st.empty()
     
     # Simple output area with progress bar and current activity
     output_container = st.container()
     log_expander = st.expander("View Activity Log")
+    log_placeholder = log_expander.empty()
     results_container = st.container()
     
     # Use session state to track if analysis is running
     if 'analysis_started' not in st.session_state:
         st.session_state.analysis_started = False
     
-    # Update UI once initially, then use rerun for updates when process is running
+    # Last values drawn into each placeholder, so unchanged sections are not redrawn
+    last_rendered = {}
+    
+    # Redraw the placeholders from the current process state
     def update_ui():
+        # Show simplified log in expander
+        log_state = (run.activity_log[-1] if run.activity_log else None, run.output_count if show_debug else 0)
+        if last_rendered.get("log") != log_state:
+            last_rendered["log"] = log_state
+            render_log()
+        
         # Update status and progress bar
+        overall = (run.status, run.progress)
+        if last_rendered.get("overall") != overall:
+            last_rendered["overall"] = overall
+            render_overall()
+        
+        # Update stage progress display
+        stages_state = tuple((stage["progress"], stage["status"]) for stage in run.stages)
+        if last_rendered.get("stages") != stages_state:
+            last_rendered["stages"] = stages_state
+            render_stages()
+        
+        # Update relevant document count
+        validation = run.stages[1]
+        validation_state = (run.relevant_document_count, validation["status"], validation["progress"])
+        if last_rendered.get("relevant") != validation_state:
+            last_rendered["relevant"] = validation_state
+            render_relevant_metric()
+        
+        # Always redraw the completion metric. Streamlit only handles rerun and stop requests
+        # (widget changes, uploads, closing the tab) when an element is sent, so every pass of
+        # the refresh loop must send one, even during a quiet stretch of the analysis.
+        completion_metric.metric("Overall Completion", f"{run.progress}%")
+    
+    def render_relevant_metric():
+        with relevant_metric.container():
+            # Only show relevant documents if validation is complete and we have relevant docs
+            validation = run.stages[1]
+            if run.relevant_document_count > 0:
+                st.metric("Relevant Documents", run.relevant_document_count)
+            elif validation["status"] == "Complete":
+                # If validation is complete but no relevant documents found
+                st.metric("Relevant Documents", "0")
+            elif validation["status"] == "In Progress":
+                # If validation is in progress
+                st.metric("Documents Being Validated", f"{validation['progress']}%")
+            else:
+                # Before validation starts
+                st.metric("Documents Ready", len(documents))
+    
+    def render_overall():
         with status_placeholder.container():
             st.subheader("Current Activity")
-            st.info(f"**{process_status}**")
-            progress_bar.progress(process_progress/100)  # Convert to 0-1 range for progress bar
+            st.info(f"**{run.status}**")
+            progress_bar.progress(run.progress/100)  # Convert to 0-1 range for progress bar
             
-            if process_progress == 100:
+            if run.progress == 100:
                 st.success("Analysis completed successfully!")
-        
-        # Update completion metric
-        with completion_metric.container():
-            st.metric("Overall Completion", f"{process_progress}%")
+    
+    def render_stages():
+        # All stages go into one HTML table, so a redraw sends a single element to the browser
+        rows = []
+        for stage in run.stages:
+            # Status color
+            status_color = "gray"
+            if stage["status"] == "Complete":
+                status_color = "green"
+            elif stage["status"] == "In Progress":
+                status_color = "blue"
+            elif stage["status"] == "Error":
+                status_color = "red"
             
-        # Update stage progress displays
-        for i, stage in enumerate(pipeline_stages):
-            with stage_containers[i].container():
-                # Create columns for stage info and progress bar
-                col1, col2 = st.columns([3, 1])
-                
-                # Status color
-                status_color = "gray"
-                if stage["status"] == "Complete":
-                    status_color = "green"
-                elif stage["status"] == "In Progress":
-                    status_color = "blue"
-                elif stage["status"] == "Error":
-                    status_color = "red"
-                
-                # Display stage name and progress
-                with col1:
-                    st.markdown(f"{stage['emoji']} **{stage['name']}** - {stage['status']}")
-                with col2:
-                    st.metric("Progress", f"{stage['progress']}%", label_visibility="collapsed")
-        
-        # Show simplified log in expander
-        with log_expander:
-            if process_output:
-                # Create simplified log for user understanding
-                simplified_log = []
-                for line in process_output:
-                    simple_msg = simplify_log_message(line)
-                    if simple_msg:
-                        simplified_log.append(simple_msg)
-                
-                # Display only unique messages to avoid repetition
-                unique_messages = []
-                for msg in simplified_log:
-                    if msg not in unique_messages:
-                        unique_messages.append(msg)
-                
+            rows.append(
+                f"<tr><td>{stage['emoji']} <b>{stage['name']}</b></td>"
+                f"<td style='color: {status_color};'>{stage['status']}</td>"
+                f"<td><progress value='{stage['progress']}' max='100' style='width: 100%;'></progress></td>"
+                f"<td style='text-align: right;'>{stage['progress']}%</td></tr>"
+            )
+        stages_placeholder.markdown(
+            "<table style='width: 100%;'>" + "".join(rows) + "</table>",
+            unsafe_allow_html=True
+        )
+    
+    def render_log():
+        with log_placeholder.container():
+            if run.activity_log:
                 # Show the last 10 unique messages
-                for msg in unique_messages[-10:]:
+                for msg in list(run.activity_log)[-10:]:
                     st.write(msg)
             else:
                 st.text("No activity yet...")
-        
-        # Show results when complete
+            
+            # Raw pipeline output
+            if show_debug and run.output:
+                st.code("\n".join(list(run.output)[-50:]))
+    
+    # Show results when complete (drawn once, after the refresh loop has finished)
+    def render_results():
         with results_container:
-            if process_progress == 100:
+            if run.progress == 100:
                 results_path = os.path.join(os.getcwd(), "output", "enhanced_document_analysis")
                 st.header("Results")
                 
@@ -602,7 +661,7 @@ def main():
                         excel_path = os.path.join(results_path, "compliance_analysis_report.xlsx")
                         st.download_button(
                             label="Download Detailed Report",
-                            data=open(excel_path, "rb").read(),
+                            data=read_file_bytes(excel_path),
                             file_name="compliance_analysis_report.xlsx",
                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                             use_container_width=True
@@ -613,7 +672,7 @@ def main():
                         consol_path = os.path.join(results_path, "consolidated_compliance_report.xlsx")
                         st.download_button(
                             label="Download Consolidated Report",
-                            data=open(consol_path, "rb").read(),
+                            data=read_file_bytes(consol_path),
                             file_name="consolidated_compliance_report.xlsx",
                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                             use_container_width=True
@@ -622,11 +681,23 @@ def main():
     # Initial UI update
     update_ui()
     
-    # If process is running, set up auto-refresh
-    if process_running:
+    # While the analysis runs, apply updates from the worker as they arrive and redraw,
+    # instead of rerunning the whole script on a timer. A rerun during the analysis
+    # re-enters this loop with the same run from session state.
+    if not run.finished:
         st.session_state.analysis_started = True
-        time.sleep(0.2)  # Small delay to avoid excessive CPU usage
-        st.experimental_rerun()  # Rerun the app to refresh the UI
+    while not run.finished:
+        drain_progress_queue(run, timeout=1.0)
+        if not run.finished and run.future.done():
+            # Everything the worker queued was put before its result was set
+            drain_progress_queue(run, timeout=0)
+            finish_analysis(run)
+        if run.finished:
+            # Rerun so the button is enabled again above the final results
+            st.rerun()
+        update_ui()
+    
+    render_results()
 
 if __name__ == "__main__":
     main()